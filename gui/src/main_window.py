@@ -45,6 +45,7 @@ KOREA_TIMEZONE = timezone(timedelta(hours=9))  # UTC+9 (한국 표준시, KST)
 # 네트워크 설정
 SERVER_IP = "127.0.0.1"       # 서버 IP (localhost)
 GUI_MERGER_PORT = 9004        # 데이터 병합기 통신 포트
+GUI_MERGER_SOCKET_PATH = None # 데이터 병합기 Unix 도메인 소켓 경로 (서버와 같은 호스트일 때, None이면 TCP 사용)
 ROBOT_COMMANDER_PORT = 9006   # 로봇 명령 포트
 DB_MANAGER_HOST = "127.0.0.1" # DB 매니저 호스트
 DB_MANAGER_PORT = 9005        # DB 매니저 포트
@@ -91,12 +92,17 @@ class DataReceiverThread(QThread):
         """메인 수신 루프"""
         if DEBUG:
             print(f"{DEBUG_TAG['INIT']} 데이터 수신 스레드 시작")
-            print(f"{DEBUG_TAG['CONN']} GUI MERGER 서버 연결 시도: {SERVER_IP}:{GUI_MERGER_PORT}")
-
-        # 소켓 생성 및 연결
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            print(f"{DEBUG_TAG['CONN']} GUI MERGER 서버 연결 시도: {GUI_MERGER_SOCKET_PATH or f'{SERVER_IP}:{GUI_MERGER_PORT}'}")
+
+        # 소켓 생성 및 연결 (소켓 경로가 설정되어 있으면 Unix 도메인 소켓으로 연결)
+        if GUI_MERGER_SOCKET_PATH:
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            merger_addr = GUI_MERGER_SOCKET_PATH
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            merger_addr = (SERVER_IP, GUI_MERGER_PORT)
         try:
-            self.socket.connect((SERVER_IP, GUI_MERGER_PORT))
+            self.socket.connect(merger_addr)
             self.connection_status.emit(True)
             if DEBUG:
                 print(f"{DEBUG_TAG['CONN']} 서버 연결 성공")
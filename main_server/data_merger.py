@@ -14,20 +14,23 @@
 #   - 최종적으로 병합되고 시각화된 데이터를(JSON + 이미지) GUI 클라이언트로 전송.
 #
 # 주요 로직:
-#   1. TrackedObject 클래스:
-#      - 추적되는 개별 객체를 나타내는 클래스.
-#      - 각 객체는 고유한 track_id와 칼만 필터(KalmanFilter) 인스턴스를 가짐.
+#   1. TrackedObjects 클래스:
+#      - 추적 중인 모든 객체를 하나로 묶어 관리하는 클래스.
+#      - 각 객체는 고유한 track_id를 가지며, 칼만 필터 상태는 객체별 인스턴스 대신 (N, 8) 상태 배열과
+#        (N, 8, 8) 공분산 배열에 저장되어 모든 객체를 한 번의 NumPy 연산으로 예측/보정.
 #      - 칼만 필터는 객체의 다음 위치를 예측하고, 새로운 탐지 결과로 상태를 보정하여
 #        부드러운 추적 궤적을 생성.
 #      - 객체의 레이블, 신뢰도, 그리고 이벤트 종류('case_type')를 함께 저장.
 #   2. DataMerger 클래스 (메인 처리 로직):
-#      - 데이터 수신 및 버퍼링: 별도 스레드에서 ImageManager와 EventAnalyzer로부터 오는
-#        데이터를 각각의 큐에서 꺼내 프레임 ID 기반의 버퍼에 저장.
 #      - 데이터 병합 (_merge_and_record_thread):
-#        - 이미지 버퍼와 이벤트 버퍼에 공통으로 존재하는 프레임 ID를 찾아 병합 처리.
-#        - AI 결과가 없는 이미지 프레임도 GUI에 부드러운 영상 스트림을 제공하기 위해 별도 처리.
+#        - 별도 수신 스레드 없이, 병합 스레드가 ImageManager와 EventAnalyzer의 큐를 직접 꺼내 처리.
+#        - 프레임 ID별로 이미지와 이벤트를 하나의 항목에 모으는 OrderedDict(pending)를 관리하고,
+#          두 데이터가 모두 모이는 즉시 병합 처리.
+#        - AI 결과가 없는 이미지 프레임도 GUI에 부드러운 영상 스트림을 제공하기 위해, 도착 순서대로
+#          정렬된 pending의 앞쪽에서 시간이 초과된 항목만 꺼내 별도 처리.
+#        - 고정 주기로 폴링하지 않고, 새 데이터가 도착하거나 가장 오래된 항목이 시간 초과되는 시점까지만 대기.
 #      - 객체 추적 (_update_tracks):
-#        - (1) 예측: 현재 추적 중인 모든 객체의 다음 위치를 칼만 필터로 예측.
+#        - (1) 예측: 오래 탐지되지 않은 객체를 제거한 뒤, 현재 추적 중인 모든 객체의 다음 위치를 칼만 필터로 예측.
 #        - (2) 매칭: 예측된 위치와 새로 들어온 AI 탐지 결과를 IoU(Intersection over Union)로 비교하여 최적의 쌍을 찾음.
 #        - (3) 업데이트: 매칭된 객체는 정보를 업데이트하고, 매칭되지 않은 새로운 탐지는 신규 객체로 등록.
 #      - 시각화 (_draw_detections_and_get_frame):
@@ -37,8 +40,17 @@
 #        - robot_status가 'detected'가 되면 _start_recording을 호출하여 임시 파일로 녹화 시작.
 #        - DBManager가 로그 저장 후 `robot_status['recording_stop_signal']`에 신호를 보내면,
 #          _stop_recording이 호출되어 녹화를 중단하고 임시 파일의 이름을 최종 이름으로 변경.
+#        - OpenCV가 GStreamer를 지원하면 하드웨어 인코더(NVIDIA NVENC, Intel/AMD VAAPI)로 녹화.
+#        - 그 외에는 libx264를 포함한 ffmpeg가 설치되어 있으면 별도 프로세스(FFmpegVideoWriter)로 인코딩하여 병합 스레드의 부담을 줄이고,
+#          없으면 cv2.VideoWriter(mp4v)로 녹화.
+#        - cv2.VideoWriter(하드웨어 인코더, mp4v)는 ThreadedVideoWriter로 감싸 인코딩과 디스크 쓰기를 별도 스레드에서 수행.
+#      - JPEG 디코딩/인코딩 (_decode_jpeg, _encode_jpeg):
+#        - nvJPEG(GPU), libjpeg-turbo(PyTurboJPEG), OpenCV 중 설치되어 사용 가능한 가장 빠른 코덱을 사용.
 #      - GUI 전송 (_gui_send_thread):
 #        - 최종 처리된 데이터(JSON + 이미지)를 큐에서 꺼내 GUI로 전송.
+#        - 시각화된 프레임의 JPEG 인코딩도 이 스레드에서 수행하여 병합 스레드의 부담을 줄임.
+#        - 별도 accept 스레드 없이, 전송 직전(미연결 시에는 주기적으로) 논블로킹 리스닝 소켓에서 새 GUI 연결을 수락.
+#        - GUI가 연결되지 않은 동안에는 병합 스레드가 전송 준비(JSON 직렬화, 전송 큐 삽입)를 생략.
 # =====================================================================================
 
 # -------------------------------------------------------------------------------------
@@ -51,13 +63,39 @@ import json
 import struct
 import time
 import os
+import functools
+import shutil
+import subprocess
+try:
+    import fcntl # 파이프 버퍼 크기 조정용 (Unix 전용)
+except ImportError:
+    fcntl = None
+import re
 import cv2
 import numpy as np
-from datetime import datetime, timedelta
-from collections import deque
+from datetime import datetime
+from collections import deque, OrderedDict
 # 객체 추적을 위한 칼만 필터 관련 라이브러리
-from filterpy.kalman import KalmanFilter
 from filterpy.common import Q_discrete_white_noise
+# 추적 객체와 탐지 결과의 최적 매칭(헝가리안 알고리즘)
+from scipy.optimize import linear_sum_assignment
+# libjpeg-turbo 기반 JPEG 디코딩/인코딩 라이브러리 (선택 사항, 없으면 OpenCV 사용)
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420, TJFLAG_FASTDCT, TJFLAG_FASTUPSAMPLE
+except ImportError:
+    TurboJPEG = None
+# GPU(nvJPEG) 기반 JPEG 디코딩/인코딩 라이브러리 (선택 사항, CUDA 환경에서만 사용)
+try:
+    from nvjpeg import NvJpeg
+except ImportError:
+    NvJpeg = None
+# 빠른 JSON 직렬화 라이브러리 (선택 사항, 없으면 표준 json 사용)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+# OpenCV가 GStreamer를 지원하도록 빌드되었는지 여부 (하드웨어 인코더를 이용한 녹화에 사용)
+CV2_HAS_GSTREAMER = re.search(r'GStreamer:\s*YES', cv2.getBuildInformation()) is not None
 
 # -------------------------------------------------------------------------------------
 # [섹션 2] 유틸리티 함수
@@ -74,73 +112,326 @@ def iou(boxA, boxB):
     iou_val = interArea / float(boxAArea + boxBArea - interArea)
     return iou_val
 
-def convert_bbox_to_z(bbox):
-    """ [x1, y1, x2, y2] 형식의 바운딩 박스를 칼만 필터의 측정값 [cx, cy, w, h]으로 변환. """
-    w = bbox[2] - bbox[0]
-    h = bbox[3] - bbox[1]
-    x = bbox[0] + w / 2.
-    y = bbox[1] + h / 2.
-    return np.array([x, y, w, h]).reshape(4, 1)
+def iou_batch(boxesA, boxesB, out=None):
+    """ (N, 4) 박스 배열과 (M, 4) 박스 배열 간의 IoU 행렬 (N, M)을 브로드캐스팅으로 한 번에 계산.
+        out에 (N, M) 배열을 넘기면 새로 할당하지 않고 그 배열에 결과를 기록. """
+    boxesA = np.asarray(boxesA, dtype=float)
+    boxesB = np.asarray(boxesB, dtype=float)
+    if out is None: out = np.empty((len(boxesA), len(boxesB)))
+    # 교집합 너비 (겹치지 않으면 0)
+    np.minimum(boxesA[:, None, 2], boxesB[None, :, 2], out=out)
+    out -= np.maximum(boxesA[:, None, 0], boxesB[None, :, 0])
+    np.clip(out, 0, None, out=out)
+    # 교집합 높이를 곱해 교집합 면적 계산
+    interH = np.minimum(boxesA[:, None, 3], boxesB[None, :, 3])
+    interH -= np.maximum(boxesA[:, None, 1], boxesB[None, :, 1])
+    np.clip(interH, 0, None, out=interH)
+    out *= interH
+    boxAArea = (boxesA[:, 2] - boxesA[:, 0]) * (boxesA[:, 3] - boxesA[:, 1])
+    boxBArea = (boxesB[:, 2] - boxesB[:, 0]) * (boxesB[:, 3] - boxesB[:, 1])
+    # 합집합 = A + B - 교집합. 면적이 0인 박스끼리의 0 나눗셈을 피하기 위해 분모에 작은 값을 더함
+    union = boxAArea[:, None] + boxBArea[None, :]
+    union -= out
+    union += 1e-9
+    out /= union
+    return out
+
+def convert_bbox_to_z(bboxes):
+    """ (N, 4) [x1, y1, x2, y2] 형식의 바운딩 박스 배열을 칼만 필터의 측정값 (N, 4) [cx, cy, w, h]으로 변환. """
+    bboxes = np.asarray(bboxes, dtype=float).reshape(-1, 4)
+    w = bboxes[:, 2] - bboxes[:, 0]
+    h = bboxes[:, 3] - bboxes[:, 1]
+    return np.stack([bboxes[:, 0] + w / 2., bboxes[:, 1] + h / 2., w, h], axis=1)
 
 def convert_x_to_bbox(x):
-    """ 칼만 필터의 상태값 [cx, cy, w, h, ...]에서 바운딩 박스 [x1, y1, x2, y2]를 추출. """
-    w = x[2]
-    h = x[3]
-    return np.array([x[0] - w / 2., x[1] - h / 2., x[0] + w / 2., x[1] + h / 2.]).flatten()
+    """ 칼만 필터의 (N, 8) 상태값 [cx, cy, w, h, ...]에서 (N, 4) 바운딩 박스 [x1, y1, x2, y2]를 추출. """
+    half_w, half_h = x[:, 2] / 2., x[:, 3] / 2.
+    # 열마다 임시 배열을 만들어 쌓는 대신, 결과 배열 하나에 각 좌표를 바로 기록
+    bboxes = np.empty((len(x), 4))
+    np.subtract(x[:, 0], half_w, out=bboxes[:, 0])
+    np.subtract(x[:, 1], half_h, out=bboxes[:, 1])
+    np.add(x[:, 0], half_w, out=bboxes[:, 2])
+    np.add(x[:, 1], half_h, out=bboxes[:, 3])
+    return bboxes
+
+def _json_default(obj):
+    """ 표준 json이 직렬화하지 못하는 NumPy 배열/스칼라를 파이썬 기본 타입으로 변환. """
+    if isinstance(obj, (np.ndarray, np.generic)):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def encode_json(data):
+    """ dict를 JSON 바이트로 직렬화. orjson이 있으면 사용하고(bytes를 바로 반환), 없으면 표준 json으로 대체 (공백 없는 compact 형식).
+        NumPy 배열/스칼라가 섞여 있어도 tolist() 변환 없이 그대로 직렬화. """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, default=_json_default, separators=(',', ':')).encode('utf-8')
+
+# AI 결과 없는 프레임의 GUI 전송 JSON은 필드 구성이 고정이므로, dict 직렬화 대신 바이트 템플릿에 값만 채워 넣음
+IMAGE_ONLY_JSON_TEMPLATE = b'{"frame_id":%d,"timestamp":%s,"detections":[],"robot_status":%s,"location":%s}'
+
+@functools.lru_cache(maxsize=64)
+def encode_json_cached(value):
+    """ 로봇 상태/위치처럼 자주 반복되는 값의 JSON 바이트를 캐시하여 재사용. """
+    return encode_json(value)
+
+def encode_image_only_json(frame_id, timestamp, state, location):
+    """ AI 결과 없는 프레임의 GUI 전송 JSON을 템플릿으로 생성. frame_id가 정수가 아니면 일반 직렬화로 대체. """
+    if type(frame_id) is not int:
+        return encode_json({"frame_id": frame_id, "timestamp": timestamp, "detections": [],
+                            "robot_status": state, "location": location})
+    return IMAGE_ONLY_JSON_TEMPLATE % (frame_id, encode_json(timestamp),
+                                       encode_json_cached(state), encode_json_cached(location))
+
+IOV_MAX = 1024 # sendmsg 한 번에 넘길 수 있는 최대 버퍼 개수 (Linux 기준)
+
+def sendmsg_all(sock, buffers):
+    """ 여러 버퍼(len()이 바이트 수인 bytes류 객체)를 이어 붙이지 않고 sendmsg(writev)로 전송. 부분 전송 시 남은 부분을 이어서 전송. """
+    if not hasattr(sock, 'sendmsg'): # sendmsg를 지원하지 않는 플랫폼(Windows)은 합쳐서 전송
+        sock.sendall(b''.join(buffers))
+        return
+    buffers = list(buffers)
+    i = 0
+    while i < len(buffers):
+        sent = sock.sendmsg(buffers[i:i + IOV_MAX])
+        # 완전히 전송된 버퍼는 건너뛰고, 일부만 전송된 버퍼는 남은 부분만 memoryview로 잘라 다시 전송
+        while i < len(buffers) and sent >= len(buffers[i]):
+            sent -= len(buffers[i])
+            i += 1
+        if sent:
+            buffers[i] = memoryview(buffers[i])[sent:]
 
 # -------------------------------------------------------------------------------------
-# [섹션 3] TrackedObject 클래스
+# [섹션 3] TrackedObjects 클래스
 # -------------------------------------------------------------------------------------
-class TrackedObject:
-    """ 추적되는 각 객체의 상태와 칼만 필터를 관리하는 클래스. """
+class TrackedObjects:
+    """ 추적 중인 모든 객체의 상태와 칼만 필터를 배열로 묶어(SoA) 한 번의 NumPy 연산으로 예측/보정하는 클래스. """
     next_id = 0 # 모든 객체에 고유 ID를 할당하기 위한 클래스 변수
-    def __init__(self, initial_bbox, label, confidence, case_type):
-        self.id = TrackedObject.next_id # 고유 ID 할당
-        TrackedObject.next_id += 1
-        
-        # 객체의 속성 정보
-        self.label = label
-        self.confidence = confidence
-        self.case_type = case_type # 이벤트 종류 (danger, illegal, emergency)
-        self.last_updated = time.time() # 마지막으로 업데이트된 시간
-        self.missed_frames = 0 # 연속으로 탐지되지 않은 프레임 수
-        
-        # --- 칼만 필터 설정 (8차원 상태, 4차원 측정) ---
-        # 상태 변수 (x): [cx, cy, w, h, vx, vy, vw, vh] (중심점, 크기, 각 속도)
-        self.kf = KalmanFilter(dim_x=8, dim_z=4)
-        dt = 1.0 # 시간 간격
-        # 상태 전이 행렬 (F): 이전 상태가 현재 상태에 어떻게 영향을 미치는지 정의
-        self.kf.F = np.array([[1,0,0,0,dt,0,0,0], [0,1,0,0,0,dt,0,0], [0,0,1,0,0,0,dt,0], [0,0,0,1,0,0,0,dt],
-                              [0,0,0,0,1,0,0,0], [0,0,0,0,0,1,0,0], [0,0,0,0,0,0,1,0], [0,0,0,0,0,0,0,1]], dtype=float)
-        # 측정 행렬 (H): 실제 상태가 측정값으로 어떻게 나타나는지 정의
-        self.kf.H = np.array([[1,0,0,0,0,0,0,0], [0,1,0,0,0,0,0,0], [0,0,1,0,0,0,0,0], [0,0,0,1,0,0,0,0]], dtype=float)
-        # 측정 노이즈 공분산 (R): AI 탐지 결과(측정값)의 불확실성. 클수록 예측을 더 신뢰.
-        self.kf.R *= 5.
-        # 프로세스 노이즈 공분산 (Q): 모델 예측의 불확실성. 클수록 객체의 급격한 움직임에 잘 반응.
-        q_val = 0.1
-        self.kf.Q = Q_discrete_white_noise(dim=2, dt=1.0, var=q_val, block_size=4, order_by_dim=False)
-        # 초기 오차 공분산 (P)
-        self.kf.P *= 100.
-        # 초기 상태 설정
-        initial_state = convert_bbox_to_z(initial_bbox).flatten()
-        self.kf.x = np.array([initial_state[0], initial_state[1], initial_state[2], initial_state[3], 0, 0, 0, 0]).T
-
-    def predict(self):
-        """ 칼만 필터를 사용해 객체의 다음 상태를 예측. """
-        self.confidence *= 0.95 # 탐지되지 않을 때마다 신뢰도 감소
-        self.kf.predict()
-        return self.kf.x
-    
-    def update(self, bbox, confidence, case_type):
-        """ 새로운 탐지 결과로 칼만 필터의 상태를 업데이트. """
-        self.kf.update(convert_bbox_to_z(bbox))
-        self.confidence = confidence
-        self.case_type = case_type # case_type도 함께 업데이트
-        self.last_updated = time.time()
-        self.missed_frames = 0 # 탐지되었으므로 missed_frames 초기화
+
+    # --- 칼만 필터 설정 (8차원 상태, 4차원 측정, 모든 객체가 공유) ---
+    # 상태 변수 (x): [cx, cy, w, h, vx, vy, vw, vh] (중심점, 크기, 각 속도)
+    DT = 1.0 # 시간 간격
+    # 상태 전이 행렬 (F): 이전 상태가 현재 상태에 어떻게 영향을 미치는지 정의
+    F = np.eye(8) + np.eye(8, k=4) * DT
+    # 측정 행렬 (H): 실제 상태가 측정값으로 어떻게 나타나는지 정의
+    H = np.eye(4, 8)
+    # 측정 노이즈 공분산 (R): AI 탐지 결과(측정값)의 불확실성. 클수록 예측을 더 신뢰.
+    R = np.eye(4) * 5.
+    # 프로세스 노이즈 공분산 (Q): 모델 예측의 불확실성. 클수록 객체의 급격한 움직임에 잘 반응.
+    Q = Q_discrete_white_noise(dim=2, dt=DT, var=0.1, block_size=4, order_by_dim=False)
+    # 초기 오차 공분산 (P)
+    P0 = np.eye(8) * 100.
+
+    def __init__(self):
+        # 객체 i의 칼만 필터 상태는 x[i], P[i]에 저장
+        self.x = np.zeros((0, 8)) # (N, 8) 상태 벡터
+        self.P = np.zeros((0, 8, 8)) # (N, 8, 8) 오차 공분산
+        # 매 프레임 모든 객체에 적용되는 수치 속성은 NumPy 배열로 한 번에 갱신
+        self.confidences = np.zeros(0) # (N,) 신뢰도
+        self.missed_frames = np.zeros(0, dtype=np.int32) # (N,) 연속으로 탐지되지 않은 프레임 수
+        # 객체의 속성 정보 (배열과 같은 순서)
+        self.ids = []
+        self.labels = []
+        self.case_types = [] # 이벤트 종류 (danger, illegal, emergency)
+        self.last_updated = [] # 마지막으로 업데이트된 시간 (time.monotonic 기준)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, bboxes, labels, confidences, case_types):
+        """ 새로 탐지된 객체들을 등록하고 고유 ID를 할당. """
+        n = len(bboxes)
+        if n == 0: return
+        # 초기 상태: 측정값 [cx, cy, w, h]와 속도 0
+        new_x = np.zeros((n, 8))
+        new_x[:, :4] = convert_bbox_to_z(bboxes)
+        self.x = np.concatenate([self.x, new_x])
+        self.P = np.concatenate([self.P, np.broadcast_to(self.P0, (n, 8, 8))])
+        self.ids.extend(range(TrackedObjects.next_id, TrackedObjects.next_id + n))
+        TrackedObjects.next_id += n
+        self.confidences = np.concatenate([self.confidences, np.asarray(confidences, dtype=float)])
+        self.missed_frames = np.concatenate([self.missed_frames, np.zeros(n, dtype=np.int32)])
+        self.labels.extend(labels)
+        self.case_types.extend(case_types)
+        self.last_updated.extend([time.monotonic()] * n)
+
+    def predict(self, max_missed_frames):
+        """ 오래 탐지되지 않은 객체를 먼저 제거한 뒤, 남은 모든 객체의 다음 상태를 한 번에 예측하고 (N, 4) 바운딩 박스를 반환. """
+        self.remove_stale(max_missed_frames)
+        self.confidences *= 0.95 # 탐지되지 않을 때마다 신뢰도 감소
+        self.missed_frames += 1
+        self.x = self.x @ self.F.T
+        self.P = self.F @ self.P @ self.F.T + self.Q
+        return convert_x_to_bbox(self.x)
+
+    def update(self, indices, bboxes, confidences, case_types):
+        """ 매칭된 객체들(indices)의 칼만 필터 상태를 새로운 탐지 결과로 한 번에 보정. """
+        if len(indices) == 0: return
+        idx = np.asarray(indices)
+        x, P = self.x[idx], self.P[idx]
+        # 잔차: y = z - Hx
+        y = convert_bbox_to_z(bboxes) - x @ self.H.T
+        # 칼만 이득: K = P H^T S^-1 (S = H P H^T + R은 대칭이므로 K^T = S^-1 H P로 풀이)
+        PHT = P @ self.H.T
+        S = self.H @ PHT + self.R
+        K = np.linalg.solve(S, PHT.transpose(0, 2, 1)).transpose(0, 2, 1)
+        self.x[idx] = x + (K @ y[:, :, None])[:, :, 0]
+        # 수치적으로 안정적인 Joseph 형식 공분산 보정: P = (I-KH) P (I-KH)^T + K R K^T
+        I_KH = np.eye(8) - K @ self.H
+        self.P[idx] = I_KH @ P @ I_KH.transpose(0, 2, 1) + K @ self.R @ K.transpose(0, 2, 1)
+
+        self.confidences[idx] = confidences
+        self.missed_frames[idx] = 0 # 탐지되었으므로 missed_frames 초기화
+        now = time.monotonic()
+        for i, case_type in zip(indices, case_types):
+            self.case_types[i] = case_type # case_type도 함께 업데이트
+            self.last_updated[i] = now
+
+    def get_bboxes(self):
+        """ 현재 상태의 (N, 4) 바운딩 박스를 반환. """
+        return convert_x_to_bbox(self.x)
+
+    def remove_stale(self, max_missed_frames):
+        """ missed_frames가 임계값을 초과한 객체를 배열에서 제거 (남은 객체의 순서는 유지). """
+        keep = self.missed_frames <= max_missed_frames
+        if keep.all(): return
+        self.x = self.x[keep]
+        self.P = self.P[keep]
+        self.confidences = self.confidences[keep]
+        self.missed_frames = self.missed_frames[keep]
+        keep = keep.tolist()
+        for name in ('ids', 'labels', 'case_types', 'last_updated'):
+            setattr(self, name, [v for v, k in zip(getattr(self, name), keep) if k])
+
+
+# -------------------------------------------------------------------------------------
+# [섹션 4] 녹화기 클래스 (FFmpegVideoWriter, ThreadedVideoWriter)
+# -------------------------------------------------------------------------------------
+class FFmpegVideoWriter:
+    """ BGR 프레임을 파이프로 ffmpeg 프로세스에 넘겨 H.264로 인코딩하는, cv2.VideoWriter와 같은 인터페이스의 녹화기. """
+    PIPE_SIZE = 1 << 20 # 파이프 버퍼 크기 (Linux). 인코더가 잠시 밀려도 write()가 바로 막히지 않도록 확장
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def is_available():
+        """ PATH의 ffmpeg가 libx264 인코더를 포함하는지 확인 (배포판/essentials 빌드에는 없을 수 있음). 결과는 한 번만 계산. """
+        if not shutil.which('ffmpeg'): return False
+        try:
+            result = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], stdin=subprocess.DEVNULL,
+                                    capture_output=True, timeout=5)
+        except (OSError, subprocess.SubprocessError):
+            return False
+        return b'libx264' in result.stdout
+
+    def __init__(self, path, fps, frame_size):
+        self.frame_size = frame_size # (w, h)
+        w, h = frame_size
+        self.process = subprocess.Popen(
+            ['ffmpeg', '-y', '-loglevel', 'error',
+             '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{w}x{h}', '-r', str(fps), '-i', '-',
+             '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', path],
+            stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        # ffmpeg의 오류 메시지를 다른 로그와 같은 형식으로 콘솔에 출력 (파이프가 가득 차 ffmpeg가 멈추지 않도록 계속 읽음)
+        self.log_thread = threading.Thread(target=self._log_stderr, name="FFmpegLog", daemon=True)
+        self.log_thread.start()
+        if fcntl is not None and hasattr(fcntl, 'F_SETPIPE_SZ'):
+            try:
+                fcntl.fcntl(self.process.stdin.fileno(), fcntl.F_SETPIPE_SZ, self.PIPE_SIZE)
+            except OSError: # 시스템 최대 파이프 크기를 넘는 경우 기본 크기 사용
+                pass
+
+    def _log_stderr(self):
+        for line in self.process.stderr:
+            print(f"[FFmpegVideoWriter] ffmpeg: {line.decode(errors='replace').rstrip()}")
+
+    def isOpened(self):
+        return self.process.poll() is None
+
+    def write(self, frame):
+        """ 프레임을 복사 없이 ffmpeg 표준 입력으로 전달. 크기가 다른 프레임은 cv2.VideoWriter처럼 무시. """
+        h, w = frame.shape[:2]
+        if (w, h) != self.frame_size or self.process.stdin.closed: return
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frame).data)
+        except (BrokenPipeError, OSError) as e: # ffmpeg 프로세스가 종료됨
+            print(f"[FFmpegVideoWriter] 녹화 프레임 전달 실패: {e}")
+            self.process.stdin.close()
+
+    def release(self):
+        """ 입력을 닫아 ffmpeg가 남은 프레임을 인코딩하고 파일을 마무리하도록 한 뒤 종료를 기다림. """
+        try:
+            if not self.process.stdin.closed: self.process.stdin.close()
+            self.process.wait(timeout=10)
+        except (BrokenPipeError, OSError):
+            pass
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log_thread.join(timeout=1) # 남은 ffmpeg 오류 메시지를 먼저 출력
+        if self.process.returncode: # 비정상 종료: 녹화 파일이 없거나 손상되었을 수 있음
+            print(f"[FFmpegVideoWriter] ffmpeg 비정상 종료 (코드 {self.process.returncode}), 녹화 파일이 불완전할 수 있음")
+
+
+class ThreadedVideoWriter:
+    """ cv2.VideoWriter의 인코딩과 디스크 쓰기를 별도 스레드에서 수행하는, 같은 인터페이스의 래퍼. """
+    QUEUE_SIZE = 64 # 쓰기 대기 프레임 최대 개수 (초과 시 프레임을 버려 병합 스레드가 막히지 않도록 함)
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.frame_queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+        self.dropped_frames = 0
+        self.thread = threading.Thread(target=self._write_loop, name="VideoWriter", daemon=True)
+        self.thread.start()
+
+    def isOpened(self):
+        return self.writer.isOpened()
+
+    def write(self, frame):
+        """ 프레임을 쓰기 큐에 넣고 바로 반환. 프레임은 이후 수정되지 않으므로 복사하지 않음. """
+        try:
+            self.frame_queue.put_nowait(frame)
+        except queue.Full:
+            self.dropped_frames += 1
+
+    def release(self):
+        """ 대기 중인 프레임을 모두 쓴 뒤 녹화기를 닫음. """
+        self.frame_queue.put(None)
+        self.thread.join()
+        self.writer.release()
+        if self.dropped_frames:
+            print(f"[ThreadedVideoWriter] 쓰기 지연으로 버려진 녹화 프레임: {self.dropped_frames}")
+
+    def _write_loop(self):
+        while True:
+            frame = self.frame_queue.get()
+            if frame is None: return # release()가 넣은 종료 신호
+            self.writer.write(frame)
 
 
 class DataMerger(threading.Thread):
+    # --- 클래스 상수 정의 ---
+    HEADER_STRUCT = struct.Struct('>I')  # GUI 전송 패킷의 4바이트 길이 헤더 (포맷을 한 번만 컴파일하여 재사용)
+    GUI_SEND_BUFFER_SIZE = 1 << 20  # GUI 소켓 송신 버퍼 크기 (JPEG 한 프레임이 전송 중간에 막히지 않도록 1MB)
+    # GUI 전송 대기 프레임 최대 개수. 초과 시 가장 오래된 프레임부터 버리므로, GUI가 느려져도 밀린 옛 영상 대신
+    # 항상 최신 프레임을 받도록 작게 유지 (전송 중인 프레임 뒤로 최대 2프레임, 20fps 기준 0.1초 분량)
+    GUI_SEND_QUEUE_SIZE = 2
+    GUI_SEND_BATCH_SIZE = GUI_SEND_QUEUE_SIZE  # 전송이 밀렸을 때 한 번의 sendmsg로 묶어 보낼 최대 프레임 수
+    GUI_ACCEPT_INTERVAL = 0.1  # GUI 미연결 시 새 연결을 확인하는 주기 (초)
+    JPEG_QUALITY = 80  # GUI 전송용 JPEG 재인코딩 품질 (모니터링 화면용으로 충분하며 90보다 인코딩이 빠르고 작음)
+    MERGE_TIMEOUT_NS = 300_000_000  # 이미지가 AI 결과를 기다리는 최대 시간 (0.3초, time.monotonic_ns 기준)
+    PENDING_MAX_SIZE = 300  # 병합 대기 중인 최대 프레임 수 (30fps 기준 약 10초 분량, 초과 시 가장 오래된 항목부터 처리)
+    MERGE_IDLE_WAIT = 0.1  # 처리할 데이터가 없을 때 병합 스레드의 최대 대기 시간 (녹화 종료 신호 확인 주기, 초)
+    EVENT_POLL_INTERVAL = 0.03  # 이미지/이벤트 큐가 별도일 때 이벤트 큐 확인 주기 (초)
+    # 시각화 설정: case_type별 바운딩 박스 색상 (BGR, 그 외 종류는 기본 초록색)
+    CASE_COLORS = {'danger': (0, 0, 255), 'illegal': (255, 0, 0), 'emergency': (0, 255, 0)}  # 빨강, 파랑, 초록
+    DEFAULT_BOX_COLOR = (0, 255, 0)
+    TEXT_COLOR = (255, 255, 255)
+    FONT = cv2.FONT_HERSHEY_SIMPLEX
+    RECORD_FPS = 20.0  # 녹화 영상 프레임 레이트
+    # GStreamer 하드웨어 H.264 인코더 후보 (NVIDIA NVENC -> Intel/AMD VAAPI 순으로 시도)
+    GST_HW_ENCODERS = ('nvh264enc preset=low-latency-hq', 'vaapih264enc')
+    # 하드웨어 인코더를 사용하는 GStreamer 녹화 파이프라인 (encoder와 location은 녹화 시작 시 지정)
+    GST_RECORD_PIPELINE = 'appsrc ! videoconvert ! {encoder} ! h264parse ! mp4mux ! filesink location="{path}"'
+
     def __init__(self, image_queue, event_queue, gui_listen_addr, robot_status):
         super().__init__()
         self.name = "DataMerger"
@@ -149,13 +440,28 @@ class DataMerger(threading.Thread):
         # --- 공유 자원 및 외부 설정 ---
         self.image_queue = image_queue
         self.event_queue = event_queue
-        self.gui_send_queue = queue.Queue(maxsize=100)
+        # 생산자(병합 스레드)와 소비자(전송 스레드)가 하나씩이므로, GIL 아래에서 append/popleft가 원자적인 deque를 잠금 없이 사용.
+        # maxlen을 지정하면 가득 찼을 때 append가 가장 오래된 프레임을 자동으로 버림. 전송 스레드는 이벤트로 깨움.
+        self.gui_send_queue = deque(maxlen=self.GUI_SEND_QUEUE_SIZE)
+        self.gui_send_event = threading.Event()
+        self.dropped_frames = 0 # GUI 전송이 밀려 버려진 프레임 수 (모니터링용)
+        # 프레임마다 헤더 bytes를 새로 만들지 않도록, 배치 내 위치별 4바이트 헤더 버퍼와 그 view를 미리 할당.
+        # sendmsg는 커널로 복사를 마친 뒤 반환하므로 다음 배치에서 같은 버퍼를 재사용해도 안전.
+        header_size = self.HEADER_STRUCT.size
+        self._header_buf = bytearray(header_size * self.GUI_SEND_BATCH_SIZE)
+        header_view = memoryview(self._header_buf)
+        self._header_views = [header_view[i * header_size:(i + 1) * header_size]
+                              for i in range(self.GUI_SEND_BATCH_SIZE)]
         self.robot_status = robot_status
+        # 병합 주기마다 한 번 읽어 두는 robot_status 스냅샷 (주기 안의 모든 프레임이 같은 상태 값을 사용)
+        self.current_state = robot_status.get('state', 'idle')
+        self.current_location = robot_status.get('current_location', 'BASE')
         
-        # --- 내부 버퍼 및 잠금 ---
-        self.image_buffer = {}
-        self.event_buffer = {}
-        self.buffer_lock = threading.Lock()
+        # --- 내부 버퍼 ---
+        # pending은 병합 스레드만 접근하므로 잠금이 필요 없음.
+        # frame_id -> {'ts': 최초 도착 시각(monotonic_ns), 'image': (jpeg, timestamp), 'event': event_data}
+        # 삽입(도착) 순서가 유지되므로 가장 오래된 항목이 항상 맨 앞에 위치.
+        self.pending = OrderedDict()
 
         # --- GUI 통신 설정 ---
         self.gui_listen_addr = gui_listen_addr
@@ -163,9 +469,11 @@ class DataMerger(threading.Thread):
         self.gui_client_socket = None
 
         # --- 객체 추적 관련 설정 ---
-        self.tracked_objects = {} # 현재 추적중인 객체들을 저장하는 딕셔너리
+        self.tracked_objects = TrackedObjects() # 현재 추적중인 객체들의 칼만 필터 상태와 속성
         self.iou_threshold = 0.3 # 추적과 탐지를 매칭시키기 위한 IoU 임계값
         self.max_missed_frames = 10 # 객체 추적을 포기하기 전까지 놓칠 수 있는 최대 프레임 수
+        # 프레임마다 IoU 행렬을 새로 할당하지 않도록 재사용하는 버퍼 (추적 객체/탐지 수가 넘으면 확장)
+        self._iou_buf = np.empty((64, 64))
 
         # --- 녹화 관련 설정 ---
         self.is_recording = False
@@ -175,6 +483,21 @@ class DataMerger(threading.Thread):
         self.base_dir = 'main_server'
         os.makedirs(os.path.join(self.base_dir, 'images'), exist_ok=True)
         os.makedirs(os.path.join(self.base_dir, 'videos'), exist_ok=True)
+
+        # --- JPEG 코덱 설정 (nvJPEG(GPU) -> libjpeg-turbo -> OpenCV 순으로 사용 가능한 것을 선택) ---
+        self.nv_jpeg = None
+        if NvJpeg is not None:
+            try:
+                self.nv_jpeg = NvJpeg()
+            except Exception as e: # CUDA 장치나 드라이버가 없는 경우
+                print(f"[{self.name}] nvJPEG 초기화 실패, CPU JPEG 코덱 사용: {e}")
+        # PyTurboJPEG와 libturbojpeg 공유 라이브러리가 모두 있어야 libjpeg-turbo를 사용
+        self.turbo_jpeg = None
+        if TurboJPEG is not None:
+            try:
+                self.turbo_jpeg = TurboJPEG()
+            except (OSError, RuntimeError) as e:
+                print(f"[{self.name}] libturbojpeg 로드 실패, OpenCV JPEG 코덱 사용: {e}")
         
         print(f"[{self.name}] 초기화 완료 (객체 추적 칼만 필터 적용).")
 
@@ -182,71 +505,98 @@ class DataMerger(threading.Thread):
         """ DataMerger의 모든 서브 스레드를 시작하고 관리. """
         print(f"[{self.name}] 스레드 시작.")
         threads = [
-            threading.Thread(target=self._gui_accept_thread, daemon=True),
             threading.Thread(target=self._gui_send_thread, daemon=True),
-            threading.Thread(target=self._image_receive_thread, daemon=True),
-            threading.Thread(target=self._event_receive_thread, daemon=True),
             threading.Thread(target=self._merge_and_record_thread, daemon=True)
         ]
         for t in threads: t.start()
         for t in threads: t.join()
         print(f"[{self.name}] 스레드 종료.")
 
-    def _gui_accept_thread(self):
-        """ GUI 클라이언트의 연결을 수락하는 스레드. """
-        self.gui_server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.gui_server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.gui_server_socket.bind(self.gui_listen_addr)
-        self.gui_server_socket.listen(1)
-        print(f"[{self.name}] GUI 클라이언트 연결 대기 중... ({self.gui_listen_addr})")
-        while self.running:
+    def _open_gui_server_socket(self):
+        """ GUI 클라이언트 연결을 받을 논블로킹 리스닝 소켓을 생성. 주소가 경로 문자열이면 Unix 도메인 소켓 사용. """
+        try:
+            if isinstance(self.gui_listen_addr, str):
+                # 같은 호스트의 GUI는 TCP/IP 스택(체크섬, 루프백)을 거치지 않는 Unix 도메인 소켓으로 연결
+                if os.path.exists(self.gui_listen_addr): os.unlink(self.gui_listen_addr) # 이전 실행이 남긴 소켓 파일 제거
+                self.gui_server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            else:
+                self.gui_server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.gui_server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.gui_server_socket.bind(self.gui_listen_addr)
+            self.gui_server_socket.listen(1)
+            # accept()가 전송 스레드를 막지 않도록 논블로킹으로 설정
+            self.gui_server_socket.setblocking(False)
+            print(f"[{self.name}] GUI 클라이언트 연결 대기 중... ({self.gui_listen_addr})")
+        except socket.error as e:
+            print(f"[{self.name}] GUI 리스닝 소켓 생성 오류: {e}")
+            self.gui_server_socket = None
+
+    def _accept_gui_client(self):
+        """ 연결 대기 중인 GUI 클라이언트가 있으면 수락. 없으면 바로 반환 (논블로킹). """
+        if not self.gui_server_socket: return
+        while True:
             try:
                 conn, addr = self.gui_server_socket.accept()
-                print(f"[{self.name}] GUI 클라이언트 연결됨: {addr}")
-                if self.gui_client_socket: self.gui_client_socket.close()
-                self.gui_client_socket = conn
-            except socket.error:
-                if not self.running: break
-
-    def _image_receive_thread(self):
-        """ image_queue에서 이미지 데이터를 받아와 image_buffer에 저장하는 스레드. """
-        while self.running:
-            try:
-                frame_id, timestamp, jpeg_binary = self.image_queue.get(timeout=1)
-                with self.buffer_lock:
-                    self.image_buffer[frame_id] = (jpeg_binary, timestamp, datetime.now())
-            except queue.Empty:
-                continue
-
-    def _event_receive_thread(self):
-        """ event_queue에서 AI 분석 결과를 받아와 event_buffer에 저장하는 스레드. """
-        while self.running:
-            try:
-                event_data = self.event_queue.get(timeout=1)
-                frame_id = event_data['frame_id']
-                with self.buffer_lock:
-                    self.event_buffer[frame_id] = (event_data, datetime.now())
-            except queue.Empty:
-                continue
+            except OSError: # 대기 중인 연결이 없거나(BlockingIOError) 소켓이 닫힘
+                return
+            print(f"[{self.name}] GUI 클라이언트 연결됨: {addr}")
+            conn.setblocking(True)
+            # 작은 헤더가 Nagle 알고리즘에 묶여 지연되지 않도록 즉시 전송 설정 (TCP 연결에만 해당)
+            if conn.family != getattr(socket, 'AF_UNIX', None):
+                conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.GUI_SEND_BUFFER_SIZE)
+            if self.gui_client_socket: self.gui_client_socket.close()
+            self.gui_client_socket = conn
 
     def _gui_send_thread(self):
-        """ gui_send_queue에서 최종 데이터를 꺼내 GUI 클라이언트로 전송하는 스레드. """
-        while self.running:
-            try:
-                if not self.gui_client_socket:
-                    time.sleep(0.5)
+        """ GUI 연결 수락과 전송을 함께 담당하는 스레드. gui_send_queue에서 최종 데이터(JSON 바이트, 이미지)를 꺼내 GUI로 전송. """
+        self._open_gui_server_socket()
+        stopping = False
+        while self.running and not stopping:
+            if not self.gui_send_queue:
+                # GUI가 연결되어 있으면 폴링 없이 데이터가 들어올 때까지 대기.
+                # 연결이 없는 동안에는 병합 스레드가 인코딩과 큐 삽입을 생략하므로, 주기적으로 깨어나 새 연결을 확인
+                self.gui_send_event.wait(timeout=None if self.gui_client_socket else self.GUI_ACCEPT_INTERVAL)
+                # 큐를 비우기 전에 이벤트를 해제하므로, 이후에 삽입된 프레임의 신호는 유실되지 않음
+                self.gui_send_event.clear()
+                if not self.gui_send_queue:
+                    self._accept_gui_client()
                     continue
-                
-                json_data, image_binary = self.gui_send_queue.get(timeout=1)
-                
-                json_part = json.dumps(json_data).encode('utf-8')
-                payload = json_part + b'|' + image_binary
-                header = struct.pack('>I', len(payload))
-                
-                self.gui_client_socket.sendall(header + payload)
-
-            except queue.Empty:
-                continue
+            # 전송이 밀려 큐에 여러 프레임이 쌓여 있으면 함께 꺼내 하나의 sendmsg로 묶어 전송
+            batch = []
+            while self.gui_send_queue and len(batch) < self.GUI_SEND_BATCH_SIZE:
+                item = self.gui_send_queue.popleft()
+                if item is None: # stop()이 넣은 종료 신호: 이미 꺼낸 프레임까지만 전송하고 종료
+                    stopping = True
+                    break
+                batch.append(item)
+            if not batch: break
+
+            # 새로 접속한 GUI가 있으면 전송 직전에 수락 (별도 accept 스레드 불필요)
+            self._accept_gui_client()
+            # GUI가 연결되지 않은 동안의 프레임은 쌓아두지 않고 버림
+            if not self.gui_client_socket: continue
+            # 프레임마다 [헤더, JSON, 구분자, 이미지]를 이어 붙이는 복사 없이 버퍼 목록으로 구성
+            buffers = []
+            for i, (json_part, image_binary) in enumerate(batch): # JSON은 큐에 넣을 때 이미 바이트로 직렬화됨
+                if isinstance(image_binary, np.ndarray):
+                    # 시각화된 프레임은 여기서 JPEG으로 인코딩. 코덱이 GIL을 놓으므로 병합 스레드와 병렬로 진행되고,
+                    # 큐에서 버려진 프레임은 인코딩하지 않음
+                    # 인코딩 실패는 연결 문제가 아니므로 소켓 오류 처리와 분리하여 해당 프레임만 버림
+                    try:
+                        jpeg_binary = self._encode_jpeg(image_binary)
+                    except Exception as e:
+                        print(f"[{self.name}] GUI 전송 프레임 JPEG 인코딩 오류: {e}")
+                        jpeg_binary = None
+                    if jpeg_binary is None: continue
+                    # 인코딩 결과는 tobytes() 복사 없이 memoryview로 넘기고, sendmsg가 버퍼를 그대로 전송
+                    image_binary = memoryview(jpeg_binary).cast('B')
+                self.HEADER_STRUCT.pack_into(self._header_buf, i * self.HEADER_STRUCT.size,
+                                             len(json_part) + 1 + len(image_binary))
+                buffers += (self._header_views[i], json_part, b'|', image_binary)
+            if not buffers: continue
+            try:
+                sendmsg_all(self.gui_client_socket, buffers)
             except (BrokenPipeError, ConnectionResetError, socket.error) as e:
                 print(f"[{self.name}] GUI 연결 끊어짐: {e}.")
                 if self.gui_client_socket: self.gui_client_socket.close()
@@ -261,36 +611,70 @@ class DataMerger(threading.Thread):
                 self._stop_recording(stop_signal)
                 self.robot_status['recording_stop_signal'] = None
                 
-            processed_ids = set()
-            with self.buffer_lock:
-                # 이미지와 이벤트가 모두 있는 프레임 처리
-                common_ids = self.image_buffer.keys() & self.event_buffer.keys()
-                for fid in common_ids:
-                    if fid not in self.image_buffer or fid not in self.event_buffer: continue
-                    jpeg_binary, timestamp, _ = self.image_buffer[fid]
-                    event_data, _ = self.event_buffer[fid]
-                    self._process_merged_frame(fid, timestamp, jpeg_binary, event_data)
-                    processed_ids.add(fid)
-
-                # AI 결과 없이 이미지만 있는 프레임 처리 (GUI 영상 부드럽게)
-                timeout = timedelta(seconds=0.3)
-                now = datetime.now()
-                old_image_ids = {fid for fid, (_, _, ts) in self.image_buffer.items() if now - ts > timeout}
-                for fid in old_image_ids:
-                    if fid in processed_ids or fid not in self.image_buffer: continue
-                    jpeg_binary, timestamp, _ = self.image_buffer[fid]
-                    current_state = self.robot_status.get('state', 'idle')
-                    self._process_unmerged_frame(fid, timestamp, jpeg_binary, current_state)
-                    processed_ids.add(fid)
-                    
-                # 처리된 데이터 버퍼에서 제거
-                for fid in processed_ids:
-                    self.image_buffer.pop(fid, None)
-                    self.event_buffer.pop(fid, None)
-
-            # 오래된 추적 객체 정리
-            self._cleanup_tracks()
-            time.sleep(0.03)
+            # 이미지 큐에서 새 데이터를 기다림.
+            # 두 큐가 같은 객체이면(SystemManager 기본 구성) 이미지(튜플)와 이벤트(dict) 중 무엇이 도착하든 즉시 깨어나 처리.
+            # 별도 큐이면 이미지가 더 자주 도착하므로, 이벤트 처리 지연은 최대 EVENT_POLL_INTERVAL로 제한됨
+            try:
+                item = self.image_queue.get(timeout=self._merge_wait_timeout())
+            except queue.Empty:
+                item = ()
+            if item is None: return # stop()이 넣은 종료 신호
+
+            # 다른 스레드가 갱신하는 공유 상태는 대기가 끝난 뒤 주기마다 한 번만 읽어 이번 주기의 모든 프레임 처리에 사용
+            self.current_state = self.robot_status.get('state', 'idle')
+            self.current_location = self.robot_status.get('current_location', 'BASE')
+
+            # 이벤트 큐가 이미지 큐와 별도이면, 쌓인 AI 분석 결과를 대기 없이 모두 꺼내 pending에 반영
+            if self.event_queue is not self.image_queue:
+                while True:
+                    try:
+                        event_data = self.event_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if event_data is None: return # stop()이 넣은 종료 신호
+                    self._add_to_pending('event', event_data['frame_id'], event_data)
+
+            if isinstance(item, dict):
+                self._add_to_pending('event', item['frame_id'], item)
+            elif item:
+                frame_id, timestamp, jpeg_binary = item
+                self._add_to_pending('image', frame_id, (jpeg_binary, timestamp))
+
+            # AI 결과 없이 이미지만 있는 프레임 처리 (GUI 영상 부드럽게)
+            # pending은 도착 순서로 정렬되어 있으므로 앞쪽의 시간 초과 항목만 꺼내면 됨
+            # 시스템 시각 변경(NTP 등)에 영향받지 않는 단조 시계를 정수(ns)로 비교
+            now = time.monotonic_ns()
+            while self.pending and now - next(iter(self.pending.values()))['ts'] > self.MERGE_TIMEOUT_NS:
+                self._flush_oldest_pending()
+
+    def _merge_wait_timeout(self):
+        """ 고정 주기 폴링 대신, pending의 가장 오래된 항목이 시간 초과될 때까지만 대기하도록 큐 대기 시간(초)을 계산. """
+        timeout = self.MERGE_IDLE_WAIT if self.event_queue is self.image_queue else self.EVENT_POLL_INTERVAL
+        if self.pending:
+            remaining_ns = next(iter(self.pending.values()))['ts'] + self.MERGE_TIMEOUT_NS - time.monotonic_ns()
+            timeout = min(timeout, max(remaining_ns, 0) / 1e9)
+        return timeout
+
+    def _add_to_pending(self, kind, frame_id, data):
+        """ 이미지('image') 또는 이벤트('event')를 pending에 모으고, 두 데이터가 모두 모이면 즉시 병합 처리. """
+        entry = self.pending.get(frame_id)
+        if entry is None:
+            entry = self.pending[frame_id] = {'ts': time.monotonic_ns()}
+            # 병합 스레드가 밀려 시간 초과 처리가 늦어져도 메모리가 무한히 늘지 않도록 크기 상한 적용
+            while len(self.pending) > self.PENDING_MAX_SIZE:
+                self._flush_oldest_pending()
+        entry[kind] = data
+        if 'image' in entry and 'event' in entry:
+            del self.pending[frame_id]
+            jpeg_binary, timestamp = entry['image']
+            self._process_merged_frame(frame_id, timestamp, jpeg_binary, entry['event'])
+
+    def _flush_oldest_pending(self):
+        """ pending에서 가장 오래된 항목을 꺼내, 이미지가 있으면 AI 결과 없이 처리하고 이벤트만 있으면 폐기. """
+        fid, entry = self.pending.popitem(last=False)
+        if 'image' not in entry: return # 이미지가 이미 처리된 뒤 늦게 도착한 이벤트는 폐기
+        jpeg_binary, timestamp = entry['image']
+        self._process_unmerged_frame(fid, timestamp, jpeg_binary, self.current_state)
 
     def _process_merged_frame(self, frame_id, timestamp, jpeg_binary, event_data):
         """ AI 분석 결과와 병합된 프레임을 처리 (객체 추적, 녹화, GUI 전송). """
@@ -299,142 +683,193 @@ class DataMerger(threading.Thread):
         # 칼만 필터 기반 객체 추적 수행
         filtered_detections = self._update_tracks(raw_detections)
 
-        # 추적 결과를 이미지에 시각화
-        annotated_frame = self._draw_detections_and_get_frame(jpeg_binary, filtered_detections)
-        if annotated_frame is None: return
+        # 녹화 중이 아니고 GUI도 연결되어 있지 않으면 프레임을 사용할 곳이 없으므로,
+        # 추적 상태만 갱신하고 디코딩/드로잉/JSON 직렬화를 모두 생략
+        recording = self.current_state == 'detected'
+        if not recording and self.gui_client_socket is None: return
+
+        if filtered_detections:
+            # 추적 결과를 이미지에 시각화.
+            # GUI 전송이 밀려 전송 큐가 가득 차 있고 녹화 중이 아니면, 절반 해상도로 디코딩해
+            # 디코딩/드로잉/재인코딩 비용과 전송량을 줄임 (녹화는 원본 해상도가 필요)
+            reduced = not recording and len(self.gui_send_queue) >= self.GUI_SEND_QUEUE_SIZE
+            gui_image = self._draw_detections_and_get_frame(jpeg_binary, filtered_detections, reduced)
+            if gui_image is None: return
+
+            # 녹화 처리
+            self._handle_recording(gui_image)
+        else:
+            # 그릴 객체가 없으면 디코딩→재인코딩 없이 원본 JPEG을 그대로 전송하고, 녹화 중일 때만 디코딩
+            gui_image = jpeg_binary
+            if recording:
+                raw_frame = self._decode_jpeg(jpeg_binary)
+                if raw_frame is None: return
+                self._handle_recording(raw_frame)
 
-        # 녹화 처리
-        self._handle_recording(annotated_frame)
-        
-        if self.gui_send_queue.full(): return
-        _, annotated_jpeg_binary = cv2.imencode('.jpg', annotated_frame, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
+        # GUI가 연결되지 않은 동안에는 어차피 전송되지 않으므로 전송 준비(JSON 직렬화, 전송 스레드의 JPEG 인코딩)를 생략
+        if self.gui_client_socket is None: return
 
         merged_json = {
             "frame_id": frame_id,
             "timestamp": timestamp,
             "detections": filtered_detections, # 추적된 객체 정보
-            "robot_status": self.robot_status.get('state', 'detected'),
-            "location": self.robot_status.get('current_location', 'unknown')
+            "robot_status": self.current_state,
+            "location": self.current_location
         }
-        # GUI 전송 큐에 삽입
-        self.gui_send_queue.put((merged_json, annotated_jpeg_binary.tobytes()))
+        # GUI 전송 큐에 삽입 (JSON은 프레임당 한 번만 바이트로 직렬화)
+        # 시각화된 프레임은 인코딩하지 않은 채로 넘기고, JPEG 인코딩은 전송 스레드에서 수행 (원본 JPEG은 그대로 전송)
+        self._put_gui_send_queue((encode_json(merged_json), gui_image))
 
     def _update_tracks(self, new_detections):
         """ 칼만 필터와 IoU를 사용하여 객체 추적을 업데이트. """
-        # 1. 예측 단계: 모든 추적 객체의 다음 상태를 예측
-        predicted_bboxes = {}
-        for track_id, tracker in self.tracked_objects.items():
-            predicted_state = tracker.predict()
-            predicted_bboxes[track_id] = convert_x_to_bbox(predicted_state)
-            tracker.missed_frames += 1
+        tracks = self.tracked_objects
+        # 1. 예측 단계: missed_frames가 임계값을 초과한 객체를 제거하고, 남은 추적 객체의 다음 상태를 한 번에 예측
+        predicted_bboxes = tracks.predict(self.max_missed_frames)
 
         # 2. 매칭 단계: 예측된 바운딩 박스와 새로운 탐지 결과를 IoU 기반으로 매칭
         unmatched_detections = list(range(len(new_detections)))
         matched_pairs = []
 
-        if len(predicted_bboxes) > 0 and len(new_detections) > 0:
-            iou_matrix = np.zeros((len(predicted_bboxes), len(new_detections)), dtype=float)
-            track_ids = list(predicted_bboxes.keys())
-            for t, track_id in enumerate(track_ids):
-                for d, det in enumerate(new_detections):
-                    iou_matrix[t, d] = iou(predicted_bboxes[track_id], det['box'])
-            
-            while iou_matrix.max() > self.iou_threshold:
-                t, d = np.unravel_index(np.argmax(iou_matrix), iou_matrix.shape)
-                matched_pairs.append((track_ids[t], d))
-                if d in unmatched_detections:
-                    unmatched_detections.remove(d)
-                iou_matrix[t, :] = -1
-                iou_matrix[:, d] = -1
+        if len(tracks) > 0 and len(new_detections) > 0:
+            # 모든 (추적 객체, 탐지) 쌍의 IoU를 파이썬 이중 루프 대신 NumPy 연산 한 번으로, 재사용 버퍼에 계산
+            num_tracks, num_dets = len(tracks), len(new_detections)
+            if num_tracks > self._iou_buf.shape[0] or num_dets > self._iou_buf.shape[1]:
+                self._iou_buf = np.empty((max(num_tracks, self._iou_buf.shape[0]), max(num_dets, self._iou_buf.shape[1])))
+            iou_matrix = iou_batch(predicted_bboxes, [det['box'] for det in new_detections],
+                                   out=self._iou_buf[:num_tracks, :num_dets])
+
+            # IoU 합이 최대가 되는 전역 최적 매칭을 한 번에 구한 뒤, 임계값 이하의 쌍은 매칭에서 제외
+            row_ind, col_ind = linear_sum_assignment(iou_matrix, maximize=True)
+            valid = iou_matrix[row_ind, col_ind] > self.iou_threshold
+            matched_pairs = list(zip(row_ind[valid].tolist(), col_ind[valid].tolist()))
+            matched_detections = set(col_ind[valid].tolist())
+            unmatched_detections = [d for d in unmatched_detections if d not in matched_detections]
 
         # 3. 업데이트 단계
         # 매칭된 객체 업데이트 (case_type 포함)
-        for track_id, det_idx in matched_pairs:
-            det = new_detections[det_idx]
-            self.tracked_objects[track_id].update(det['box'], det.get('confidence', 0.9), det.get('case', 'unknown'))
+        matched = [new_detections[d] for _, d in matched_pairs]
+        tracks.update([t for t, _ in matched_pairs], [det['box'] for det in matched],
+                      [det.get('confidence', 0.9) for det in matched], [det.get('case', 'unknown') for det in matched])
 
         # 매칭되지 않은 새로운 객체 생성 (case_type 포함)
-        for det_idx in unmatched_detections:
-            det = new_detections[det_idx]
-            new_tracker = TrackedObject(det['box'], det['label'], det.get('confidence', 0.9), det.get('case', 'unknown'))
-            self.tracked_objects[new_tracker.id] = new_tracker
+        unmatched = [new_detections[d] for d in unmatched_detections]
+        tracks.add([det['box'] for det in unmatched], [det['label'] for det in unmatched],
+                   [det.get('confidence', 0.9) for det in unmatched], [det.get('case', 'unknown') for det in unmatched])
 
         # 4. 최종 결과 생성
         # 현재 유효한 추적 객체 목록을 생성하여 반환 (case_type 포함)
+        # 전송 JSON 크기를 줄이기 위해 박스 좌표는 정수 픽셀로, 신뢰도는 소수점 둘째 자리까지로 양자화
+        # (드로잉은 어차피 정수 좌표를, GUI는 신뢰도를 소수점 둘째 자리까지만 사용)
+        # 최근 프레임에서 탐지된 객체만 마스크로 골라, 박스는 한 번에 정수 변환 (astype(int)는 int()와 같이 0 방향으로 버림)
+        visible = np.flatnonzero(tracks.missed_frames < 2).tolist()
+        bboxes = tracks.get_bboxes()[visible].astype(int).tolist()
+        confidences = tracks.confidences[visible].round(2).tolist()
         final_detections = []
-        for track_id, tracker in self.tracked_objects.items():
-            if tracker.missed_frames < 2:
-                final_detections.append({
-                    'track_id': track_id,
-                    'label': tracker.label,
-                    'case': tracker.case_type,
-                    'box': convert_x_to_bbox(tracker.kf.x).tolist(),
-                    'confidence': tracker.confidence
-                })
+        for i, box, confidence in zip(visible, bboxes, confidences):
+            final_detections.append({
+                'track_id': tracks.ids[i],
+                'label': tracks.labels[i],
+                'case': tracks.case_types[i],
+                'box': box,
+                'confidence': confidence
+            })
         return final_detections
 
-    def _cleanup_tracks(self):
-        """ 오래 추적되지 않은(missed_frames가 임계값을 초과한) 객체를 제거. """
-        dead_tracks = [tid for tid, t in self.tracked_objects.items() if t.missed_frames > self.max_missed_frames]
-        for tid in dead_tracks:
-            del self.tracked_objects[tid]
-
-    def _draw_detections_and_get_frame(self, jpeg_binary, detections):
-        """ 추적된 객체들을 이미지에 그리고, case_type에 따라 다른 색상의 바운딩 박스를 적용. """
+    def _draw_detections_and_get_frame(self, jpeg_binary, detections, reduced=False):
+        """ 추적된 객체들을 이미지에 그리고, case_type에 따라 다른 색상의 바운딩 박스를 적용. reduced이면 절반 해상도로 처리. """
         try:
-            np_arr = np.frombuffer(jpeg_binary, np.uint8)
-            frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+            frame = self._decode_jpeg(jpeg_binary, reduced)
             if frame is None: return None
+            scale = 0.5 if reduced else 1.0 # 박스 좌표는 원본 해상도 기준
 
             if detections:
                 for det in detections:
                     box = det.get('box')
                     case_type = det.get('case', 'unknown')
                     if not box or len(box) != 4: continue
-                    x1, y1, x2, y2 = map(int, box)
+                    x1, y1, x2, y2 = (int(v * scale) for v in box)
 
                     # case_type에 따라 바운딩 박스 색상 결정
-                    color = (0, 255, 0)  # default: green (emergency)
-                    if case_type == 'danger': color = (0, 0, 255)  # red
-                    elif case_type == 'illegal': color = (255, 0, 0)  # blue
+                    color = self.CASE_COLORS.get(case_type, self.DEFAULT_BOX_COLOR)
 
                     label = det.get('label', 'unknown')
                     confidence = det.get('confidence', 0.0)
                     text = f"{det.get('track_id')} {label}: {confidence:.2f}"
 
                     cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                    cv2.putText(frame, text, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                    cv2.putText(frame, text, (x1, y1 - int(10 * scale)), self.FONT, 0.6 * scale, self.TEXT_COLOR, 2)
             return frame
         except Exception as e:
             print(f"[{self.name}] 이미지 드로잉 오류: {e}")
             return None
 
+    def _decode_jpeg(self, jpeg_binary, reduced=False):
+        """ JPEG 바이너리를 BGR 이미지로 디코딩 (reduced이면 DCT 단계에서 바로 절반 해상도로). 실패 시 None 반환. """
+        nv_jpeg = self.nv_jpeg # 전송 스레드가 인코딩 실패 시 None으로 바꿀 수 있으므로 한 번만 읽음
+        if nv_jpeg is not None and not reduced: # nvJPEG은 축소 디코딩을 지원하지 않으므로 CPU 코덱 사용
+            try:
+                return nv_jpeg.decode(bytes(jpeg_binary))
+            except Exception: # 손상된 JPEG
+                return None
+        if self.turbo_jpeg is not None:
+            try:
+                # 미리보기/녹화용이므로 정확도보다 속도를 우선한 고속 IDCT와 크로마 업샘플링 사용
+                return self.turbo_jpeg.decode(jpeg_binary, pixel_format=TJPF_BGR,
+                                              scaling_factor=(1, 2) if reduced else None,
+                                              flags=TJFLAG_FASTDCT | TJFLAG_FASTUPSAMPLE)
+            except OSError: # 손상된 JPEG
+                return None
+        flags = cv2.IMREAD_REDUCED_COLOR_2 if reduced else cv2.IMREAD_COLOR
+        return cv2.imdecode(np.frombuffer(jpeg_binary, np.uint8), flags)
+
+    def _encode_jpeg(self, frame):
+        """ BGR 이미지를 JPEG_QUALITY 품질의 JPEG 버퍼로 인코딩. 실패 시 None 반환. """
+        nv_jpeg = self.nv_jpeg
+        if nv_jpeg is not None:
+            try:
+                return nv_jpeg.encode(frame, self.JPEG_QUALITY)
+            except Exception as e: # CUDA 오류는 대개 지속되므로, 한 번만 알리고 이후로는 CPU 코덱 사용
+                print(f"[{self.name}] nvJPEG 인코딩 실패, CPU JPEG 코덱으로 전환: {e}")
+                self.nv_jpeg = None
+        if self.turbo_jpeg is not None:
+            # PyTurboJPEG 기본값(4:2:2) 대신 OpenCV와 같은 4:2:0 크로마 서브샘플링으로 인코딩 (더 빠르고 작음)
+            return self.turbo_jpeg.encode(frame, quality=self.JPEG_QUALITY, pixel_format=TJPF_BGR,
+                                          jpeg_subsample=TJSAMP_420)
+        ok, jpeg_binary = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.JPEG_QUALITY])
+        return jpeg_binary if ok else None
+
     def _process_unmerged_frame(self, frame_id, timestamp, jpeg_binary, current_state):
         """AI 분석 결과 없이 이미지만 있는 프레임을 처리 (녹화 및 GUI 전송)."""
         if current_state in ['patrolling', 'detected'] and self.is_recording:
-            np_arr = np.frombuffer(jpeg_binary, np.uint8)
-            raw_frame = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+            raw_frame = self._decode_jpeg(jpeg_binary)
             if raw_frame is not None:
                 self._handle_recording(raw_frame)
-        
-        if self.gui_send_queue.full(): return
-        image_only_json = {
-            "frame_id": frame_id,
-            "timestamp": timestamp,
-            "detections": [],
-            "robot_status": current_state,
-            "location": self.robot_status.get('current_location', 'BASE')
-        }
-        self.gui_send_queue.put((image_only_json, jpeg_binary))
+
+        if self.gui_client_socket is None: return # GUI 미연결 시 전송 준비 생략
+        image_only_json = encode_image_only_json(frame_id, timestamp, current_state, self.current_location)
+        self._put_gui_send_queue((image_only_json, jpeg_binary))
+
+    def _put_gui_send_queue(self, item):
+        """GUI 전송 큐에 삽입. 큐가 가득 차면 가장 오래된 프레임을 버려, GUI가 항상 최신 프레임을 받도록 함."""
+        if len(self.gui_send_queue) == self.GUI_SEND_QUEUE_SIZE:
+            self.dropped_frames += 1 # append가 가장 오래된 프레임을 자동으로 버림
+        self.gui_send_queue.append(item)
+        self.gui_send_event.set()
 
     def _handle_recording(self, frame):
         """주어진 프레임에 대해 녹화 시작 또는 프레임 쓰기를 수행."""
-        current_state = self.robot_status.get('state')
-        if current_state == 'detected':
+        if self.current_state == 'detected':
             if not self.is_recording:
                 self._start_recording(frame)
             if self.video_writer:
                 self.video_writer.write(frame)
+                if isinstance(self.video_writer, FFmpegVideoWriter) and not self.video_writer.isOpened():
+                    # ffmpeg가 시작 직후(옵션/인코더 오류 등) 종료되었으면 녹화를 잃지 않도록 OpenCV 녹화기로 전환
+                    print(f"[{self.name}] ffmpeg 녹화 실패, OpenCV 녹화기(mp4v)로 전환.")
+                    self.video_writer.release()
+                    h, w = frame.shape[:2]
+                    self.video_writer = self._open_cv2_video_writer((w, h))
+                    self.video_writer.write(frame)
     
     def _start_recording(self, first_frame):
         """첫 프레임을 받아 녹화를 시작하고 임시 썸네일과 비디오 파일을 생성."""
@@ -446,14 +881,38 @@ class DataMerger(threading.Thread):
 
         try:
             h, w, _ = first_frame.shape
-            fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-            self.video_writer = cv2.VideoWriter(self.temp_video_path, fourcc, 20.0, (w, h))
+            # 하드웨어 인코더(NVENC/VAAPI) -> ffmpeg 프로세스 -> OpenCV 소프트웨어 인코더(mp4v) 순으로 사용 가능한 녹화기 선택
+            self.video_writer = self._open_hw_video_writer((w, h))
+            if self.video_writer is None and FFmpegVideoWriter.is_available():
+                # 인코딩을 별도 프로세스에서 수행하여 병합 스레드는 파이프에 프레임을 쓰기만 함
+                self.video_writer = FFmpegVideoWriter(self.temp_video_path, self.RECORD_FPS, (w, h))
+            elif self.video_writer is None:
+                self.video_writer = self._open_cv2_video_writer((w, h))
+            else:
+                # OpenCV 녹화기는 write()에서 인코딩까지 동기로 수행하므로 별도 스레드로 분리
+                self.video_writer = ThreadedVideoWriter(self.video_writer)
             cv2.imwrite(self.temp_img_path, first_frame)
             self.video_writer.write(first_frame)
         except Exception as e:
             print(f"[{self.name}] 녹화 시작 오류: {e}")
             self.is_recording = False
 
+    def _open_cv2_video_writer(self, frame_size):
+        """OpenCV 소프트웨어 인코더(mp4v) 녹화기를 별도 쓰기 스레드로 감싸 반환."""
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        return ThreadedVideoWriter(cv2.VideoWriter(self.temp_video_path, fourcc, self.RECORD_FPS, frame_size))
+
+    def _open_hw_video_writer(self, frame_size):
+        """GStreamer 하드웨어 인코더 파이프라인으로 녹화기를 열어 반환. GStreamer 미지원이거나 사용 가능한 인코더가 없으면 None 반환."""
+        if not CV2_HAS_GSTREAMER: return None
+        for encoder in self.GST_HW_ENCODERS:
+            pipeline = self.GST_RECORD_PIPELINE.format(encoder=encoder, path=self.temp_video_path)
+            writer = cv2.VideoWriter(pipeline, cv2.CAP_GSTREAMER, 0, self.RECORD_FPS, frame_size)
+            if writer.isOpened():
+                print(f"[{self.name}] 하드웨어 인코더({encoder.split()[0]})로 녹화.")
+                return writer
+        return None
+
     def _stop_recording(self, stop_signal: dict):
         """녹화를 중지하고, DBManager로부터 받은 최종 파일명으로 임시 파일의 이름을 변경."""
         final_img_path = stop_signal.get('final_image_path')
@@ -465,19 +924,19 @@ class DataMerger(threading.Thread):
             self.video_writer.release()
             print(f"[{self.name}] 임시 비디오 파일 저장 완료: {self.temp_video_path}")
 
-        try:
-            # 임시 이미지 파일 이름 변경
-            if self.temp_img_path and os.path.exists(self.temp_img_path) and final_img_path:
-                final_full_path = os.path.join(self.base_dir, final_img_path)
-                os.rename(self.temp_img_path, final_full_path)
-                print(f"[{self.name}] 최종 이미지 파일 저장: {final_full_path}")
-            # 임시 비디오 파일 이름 변경
-            if self.temp_video_path and os.path.exists(self.temp_video_path) and final_video_path:
-                final_full_path = os.path.join(self.base_dir, final_video_path)
-                os.rename(self.temp_video_path, final_full_path)
-                print(f"[{self.name}] 최종 비디오 파일 저장: {final_full_path}")
-        except Exception as e:
-            print(f"[{self.name}] 파일 이름 변경 중 오류: {e}")
+        # 임시 파일 이름을 최종 이름으로 변경. os.replace는 대상 파일이 있어도(Windows 포함) 원자적으로 덮어쓰며,
+        # 존재 여부를 미리 확인하지 않고 임시 파일이 없으면 FileNotFoundError로 건너뜀
+        for kind, temp_path, final_path in (('이미지', self.temp_img_path, final_img_path),
+                                            ('비디오', self.temp_video_path, final_video_path)):
+            if not temp_path or not final_path: continue
+            final_full_path = os.path.join(self.base_dir, final_path)
+            try:
+                os.replace(temp_path, final_full_path)
+                print(f"[{self.name}] 최종 {kind} 파일 저장: {final_full_path}")
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"[{self.name}] 파일 이름 변경 중 오류: {e}")
         
         self.video_writer = None
         self.temp_img_path = None
@@ -487,5 +946,11 @@ class DataMerger(threading.Thread):
         """스레드를 안전하게 종료."""
         print(f"\n[{self.name}] 종료 요청 수신.")
         self.running = False
+        # 블로킹 get()으로 대기 중인 수신/전송 스레드를 깨우기 위한 종료 신호(None) 삽입
+        self.image_queue.put(None)
+        if self.event_queue is not self.image_queue: self.event_queue.put(None)
+        self._put_gui_send_queue(None)
         if self.gui_client_socket: self.gui_client_socket.close()
-        if self.gui_server_socket: self.gui_server_socket.close()
\ No newline at end of file
+        if self.gui_server_socket: self.gui_server_socket.close()
+        if isinstance(self.gui_listen_addr, str) and os.path.exists(self.gui_listen_addr):
+            os.unlink(self.gui_listen_addr) # Unix 도메인 소켓 파일 정리
\ No newline at end of file
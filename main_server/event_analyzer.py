@@ -44,6 +44,9 @@ import struct # 바이너리 데이터 패킹/언패킹을 위한 모듈
 import time # 시간 관련 함수를 사용하기 위한 모듈
 from collections import deque, Counter # 양방향 큐(deque)와 카운터(Counter) 자료구조
 
+# 디버그 설정
+DEBUG = False  # True: 프레임 단위 디버그 로그 출력, False: 로그 출력 안함
+
 # -------------------------------------------------------------------------------------
 # [섹션 2] EventAnalyzer 클래스 정의
 # -------------------------------------------------------------------------------------
@@ -153,8 +156,9 @@ class EventAnalyzer(threading.Thread):
             timestamp = result_json.get('timestamp')
             detections = result_json.get('detections', [])
             
-            print("-----------------------------------------------------")
-            print(f"[✅ TCP 수신] 3. AI_Server -> {self.name}: frame_id={frame_id}, timestamp={timestamp}, dets={len(detections)}건")
+            if DEBUG:
+                print("-----------------------------------------------------")
+                print(f"[✅ TCP 수신] 3. AI_Server -> {self.name}: frame_id={frame_id}, timestamp={timestamp}, dets={len(detections)}건")
 
             now = time.time()
             # 각 탐지 결과에 'case' 정보 추가
@@ -171,7 +175,8 @@ class EventAnalyzer(threading.Thread):
             self._update_robot_state_based_on_stability()
             
             # 처리된 데이터를 DataMerger로 전송하기 위해 큐에 삽입
-            print(f"[➡️ 큐 입력] 4. {self.name} -> DataMerger: frame_id={frame_id}, timestamp={timestamp}")
+            if DEBUG:
+                print(f"[➡️ 큐 입력] 4. {self.name} -> DataMerger: frame_id={frame_id}, timestamp={timestamp}")
             self.output_queue.put(result_json)
 
         except (json.JSONDecodeError, UnicodeDecodeError) as e:
@@ -44,6 +44,9 @@ import pickle  # 파이썬 객체 직렬화/역직렬화를 위한 모듈 (카
 import cv2  # OpenCV 라이브러리 (이미지 처리, ArUco 탐지)
 import numpy as np  # 수치 연산 및 배열 처리를 위한 NumPy 라이브러리
 
+# 디버그 설정
+DEBUG = False  # True: 프레임 단위 디버그 로그 출력, False: 로그 출력 안함
+
 # -------------------------------------------------------------------------------------
 # [섹션 2] 1차원 칼만 필터 클래스
 # -------------------------------------------------------------------------------------
@@ -122,12 +125,14 @@ class ImageManager(threading.Thread):
             return None, None
 
     def _parse_udp_packet(self, data):
-        """UDP 패킷을 JSON 헤더와 이미지 바이너리로 분리."""
+        """UDP 패킷을 JSON 헤더와 이미지 바이너리로 분리. 이미지는 복사 없이 수신 버퍼를 가리키는 memoryview로 반환."""
         try:
             delimiter_pos = data.find(b'|') # 구분자 위치 검색
             if delimiter_pos == -1: return None, None
             header_bytes = data[:delimiter_pos] # 헤더 부분 추출
-            image_binary = data[delimiter_pos+1:].rstrip(b'\n') # 이미지 부분 추출 및 개행문자 제거
+            end = len(data)
+            while end > delimiter_pos + 1 and data[end - 1] == 0x0A: end -= 1 # 끝의 개행문자 제외
+            image_binary = memoryview(data)[delimiter_pos+1:end] # 이미지 부분 (슬라이스 복사 없이 참조)
             header_json = json.loads(header_bytes.decode('utf-8')) # 헤더를 JSON으로 파싱
             return header_json, image_binary
         except (json.JSONDecodeError, UnicodeDecodeError):
@@ -145,8 +150,9 @@ class ImageManager(threading.Thread):
                 
                 frame_id = header_json.get('frame_id')
                 timestamp = header_json.get('timestamp')
-                print("-----------------------------------------------------")
-                print(f"[✅ UDP 수신] 1. Robot -> {self.name}: frame_id={frame_id}, timestamp={timestamp}, size={len(data)} bytes")
+                if DEBUG:
+                    print("-----------------------------------------------------")
+                    print(f"[✅ UDP 수신] 1. Robot -> {self.name}: frame_id={frame_id}, timestamp={timestamp}, size={len(data)} bytes")
                 
                 current_state = self.robot_status.get('state', 'idle') # 현재 로봇 상태 확인
 
@@ -193,8 +199,9 @@ class ImageManager(threading.Thread):
                     # RobotCommander로 보낼 결과 데이터 생성
                     aruco_result = {'id': marker_id, 'distance': filtered_distance}
                     
-                    print(f"[➡️ 큐 입력] 2b-1. {self.name} -> RobotCommander: ArUco id={marker_id}, "
-                          f"측정거리={measured_distance:.2f}, 필터링된 거리={filtered_distance:.2f}")
+                    if DEBUG:
+                        print(f"[➡️ 큐 입력] 2b-1. {self.name} -> RobotCommander: ArUco id={marker_id}, "
+                              f"측정거리={measured_distance:.2f}, 필터링된 거리={filtered_distance:.2f}")
                     self.aruco_result_queue.put(aruco_result) # 큐에 결과 삽입
                     
                     # --- GUI 시각화용 이미지 생성 ---
@@ -207,7 +214,7 @@ class ImageManager(threading.Thread):
             # 주석이 달린 이미지를 JPEG으로 인코딩
             _, annotated_image_binary = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 90])
             # DataMerger로 전송
-            self.image_for_merger_queue.put((frame_id, timestamp, annotated_image_binary.tobytes()))
+            self.image_for_merger_queue.put((frame_id, timestamp, memoryview(annotated_image_binary).cast('B')))
         except Exception as e:
             print(f"[{self.name}] ArUco 처리 오류: {e}")
 
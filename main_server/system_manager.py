@@ -58,6 +58,7 @@ ANALYSIS_RECV_PORT = 9003 # EventAnalyzer가 AI 서버로부터 분석 결과를
 GUI_HOST = "127.0.0.1" # GUI 클라이언트가 실행되는 IP 주소 (여기서는 로컬호스트)
 GUI_MERGER_PORT = 9004 # DataMerger가 GUI 클라이언트로 데이터를 전송할 포트
 GUI_ROBOT_COMMANDER_PORT = 9006 # RobotCommander가 GUI로부터 제어 명령을 수신할 포트
+GUI_MERGER_SOCKET_PATH = None # GUI가 같은 호스트에서 실행될 때 사용할 Unix 도메인 소켓 경로 (예: '/tmp/data_merger.sock', None이면 TCP 사용)
 
 # --- DB Manager 관련 설정 ---
 DB_MANAGER_HOST = '0.0.0.0' # 모든 IP에서의 접속을 허용
@@ -92,29 +93,30 @@ class SystemManager:
 
         # --- 데이터 전달용 큐 생성 ---
         self.aruco_result_queue = queue.Queue() # ImageManager -> RobotCommander (ArUco 마커 탐지 결과)
-        self.image_for_merger_queue = queue.Queue() # ImageManager -> DataMerger (카메라 이미지)
-        self.event_result_queue = queue.Queue() # EventAnalyzer -> DataMerger (AI 분석 결과)
+        # DataMerger 입력 큐는 크기 제한이 없는 단일 소비자 큐이므로 더 가벼운 SimpleQueue 사용.
+        # 이미지와 AI 분석 결과가 하나의 큐를 공유하여, DataMerger가 어느 쪽 데이터가 도착하든 바로 깨어나 병합하도록 함
+        self.merger_input_queue = queue.SimpleQueue() # ImageManager(카메라 이미지), EventAnalyzer(AI 분석 결과) -> DataMerger
 
         # --- 컴포넌트 인스턴스 생성 및 연결 ---
         # 각 컴포넌트(스레드)를 초기화하고, 필요한 공유 자원(큐, 상태 객체)과 설정을 주입.
         self.image_manager = ImageManager(
             listen_port=IMAGE_RECV_PORT, # 로봇 이미지 수신 포트
             ai_server_addr=(AI_SERVER_HOST, AI_SERVER_PORT), # AI 서버 주소
-            image_for_merger_queue=self.image_for_merger_queue, # DataMerger로 이미지를 보낼 큐
+            image_for_merger_queue=self.merger_input_queue, # DataMerger로 이미지를 보낼 큐
             robot_status=self.robot_status, # 공유할 로봇 상태 객체
             aruco_result_queue=self.aruco_result_queue # ArUco 결과를 보낼 큐
         )
         
         self.event_analyzer = EventAnalyzer(
             listen_port=ANALYSIS_RECV_PORT, # AI 서버 분석 결과 수신 포트
-            output_queue=self.event_result_queue, # DataMerger로 이벤트 결과를 보낼 큐
+            output_queue=self.merger_input_queue, # DataMerger로 이벤트 결과를 보낼 큐
             robot_status=self.robot_status # 공유할 로봇 상태 객체
         )
         
         self.data_merger = DataMerger(
-            image_queue=self.image_for_merger_queue, # ImageManager로부터 이미지 받을 큐
-            event_queue=self.event_result_queue, # EventAnalyzer로부터 이벤트 받을 큐
-            gui_listen_addr=(GUI_HOST, GUI_MERGER_PORT), # GUI로 결과를 보낼 주소
+            image_queue=self.merger_input_queue, # ImageManager로부터 이미지 받을 큐
+            event_queue=self.merger_input_queue, # EventAnalyzer로부터 이벤트 받을 큐 (이미지와 같은 큐)
+            gui_listen_addr=GUI_MERGER_SOCKET_PATH or (GUI_HOST, GUI_MERGER_PORT), # GUI로 결과를 보낼 주소
             robot_status=self.robot_status # 공유할 로봇 상태 객체
         )
         